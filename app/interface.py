@@ -1,19 +1,32 @@
-import secrets
-import tempfile
-import uuid
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import itertools
+import os
+import threading
+import time
 import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Literal
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Literal
 
+import numpy as np
 import streamlit as st
-from bson import ObjectId
-from fastembed import TextEmbedding
-from pinecone import Pinecone
-from pymilvus import MilvusClient
-from pymongo import MongoClient
-from qdrant_client import QdrantClient
 from settings import Settings
 
+# SDKs are imported by the backend that needs them, to keep cold start fast
+if TYPE_CHECKING:
+    from fastembed import TextEmbedding
+    from pinecone import Pinecone
+    from pymilvus import MilvusClient
+    from pymongo import MongoClient
+    from qdrant_client import QdrantClient
+
+    CONNECTION_TYPES = MilvusClient | MongoClient | Pinecone | QdrantClient
+
 settings = Settings.get_settings()
 
 pinecone_settings = settings.pinecone_database_config
@@ -24,28 +37,129 @@ qdrant_settings = settings.qdrant_database_config
 
 # model = SentenceTransformer(settings.embedding_model)
 DATABASE_NAMES = Literal["Milvus", "Pinecone", "MongoDB", "QDrant"]
-CONNECTION_TYPES = MilvusClient | MongoClient | Pinecone | QdrantClient
 
+# Uploaded documents are truncated to this many characters before indexing
+MAX_DOCUMENT_CHARS = 8192
+
+# fastembed batching, `parallel=0` spreads large uploads over all cores
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_PARALLEL = 0
+
+# Documents embedded and inserted per pipeline step
+PIPELINE_BATCH_SIZE = 512
+PIPELINE_QUEUE_SIZE = 4
 
-# Connect to DB based on user selection
-def get_connection(database_name: DATABASE_NAMES) -> CONNECTION_TYPES:
-    if "connections" not in st.session_state:
-        st.session_state.connections = {}
 
-    connections = st.session_state.connections
-    if database_name in connections:
-        return connections[database_name]
+# Embedding model, loaded once per process and reused by every session. No spinner,
+# since the first load usually happens on a background embedding thread
+@st.cache_resource(show_spinner=False)
+def _get_embedder() -> TextEmbedding:
+    from fastembed import TextEmbedding
 
+    return TextEmbedding(model_name=settings.embedding_model)
+
+
+# Document embeddings, computed in the background as soon as a ZIP is uploaded
+def _take_vectors(vectors: Iterator[np.ndarray], count: int) -> np.ndarray:
+    return np.stack(list(itertools.islice(vectors, count)))
+
+
+def _embed_in_batches(texts: list[str], batches: list[Future[np.ndarray]]):
+    # A single generator keeps fastembed's worker pool alive across batches
+    try:
+        vectors = iter(
+            _get_embedder().embed(
+                texts,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                parallel=EMBEDDING_PARALLEL,
+            )
+        )
+        for start, batch in zip(range(0, len(texts), PIPELINE_BATCH_SIZE), batches):
+            count = min(PIPELINE_BATCH_SIZE, len(texts) - start)
+            batch.set_result(_take_vectors(vectors, count))
+    except Exception as exc:
+        for batch in batches:
+            if not batch.done():
+                batch.set_exception(exc)
+
+
+def _has_failed(batches: list[Future[np.ndarray]]) -> bool:
+    return any(
+        batch.done() and (batch.cancelled() or batch.exception() is not None)
+        for batch in batches
+    )
+
+
+# One future per pipeline batch, shared by every index call over the same texts.
+# Only the current upload is kept, and failed runs are dropped so they re-embed
+def _embed_cached(documents: list[tuple[str, str]]) -> list[Future[np.ndarray]]:
+    if "embeddings_by_hash" not in st.session_state:
+        st.session_state.embeddings_by_hash = {}
+
+    texts = [doc[1] for doc in documents]
+    key = hash(tuple(texts))
+    cache = st.session_state.embeddings_by_hash
+    if key not in cache or _has_failed(cache[key]):
+        cache.clear()
+        batches = [Future() for _ in range(0, len(texts), PIPELINE_BATCH_SIZE)]
+        threading.Thread(
+            target=_embed_in_batches, args=(texts, batches), daemon=True
+        ).start()
+        cache[key] = batches
+
+    return cache[key]
+
+
+# Query embeddings, keyed by the SHA-256 of the query text
+class QueryEmbeddingCache:
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def get_or_compute(
+        self,
+        query: str,
+        compute: Callable[[], np.ndarray],
+    ) -> np.ndarray:
+        key = hashlib.sha256(query.encode()).hexdigest()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        embedding = compute()
+        self._entries[key] = embedding
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return embedding
+
+
+def _get_query_embedding(query: str) -> np.ndarray:
+    if "query_emb_cache" not in st.session_state:
+        st.session_state.query_emb_cache = QueryEmbeddingCache()
+
+    embedding_model = _get_embedder()
+    return st.session_state.query_emb_cache.get_or_compute(
+        query, lambda: next(iter(embedding_model.embed([query])))
+    )
+
+
+# Connect to DB based on user selection
+@st.cache_resource
+def get_connection(database_name: DATABASE_NAMES) -> CONNECTION_TYPES:
     if database_name == "Milvus":
+        from pymilvus import MilvusClient
+
         client = MilvusClient("milvus.db")
         client.create_collection(
             collection_name=milvus_settings.collection_name,
             dimension=384,
         )
-        connections[database_name] = client
         return client
 
     elif database_name == "Pinecone":
+        from pinecone import Pinecone
+
         client = Pinecone(api_key=pinecone_settings.api_key)
         if not client.has_index(pinecone_settings.index_name):
             client.create_index_for_model(
@@ -58,140 +172,261 @@ def get_connection(database_name: DATABASE_NAMES) -> CONNECTION_TYPES:
                 },  # type: ignore
             )
 
-        connections[database_name] = client
         return client
 
     elif database_name == "MongoDB":
+        from pymongo import MongoClient
+
         client = MongoClient(mongo_settings.uri)
-        connections[database_name] = client
         return client
 
     elif database_name == "QDrant":
+        from qdrant_client import QdrantClient
+
         client = QdrantClient(":memory:")
-        connections[database_name] = client
         return client
 
 
+# Pinecone index handle, opened once and reused by every index and search call
+@st.cache_resource
+def _get_pinecone_index():
+    return get_connection("Pinecone").Index(pinecone_settings.index_name)
+
+
 # Embedding and indexing
-def index_documents(
-    connection: CONNECTION_TYPES,
+async def _index_pipeline(
     documents: list[tuple[str, str]],
+    insert: Callable[[int, list[tuple[str, str]], np.ndarray], None],
 ):
-    if isinstance(connection, MilvusClient):
-        embedding_model = TextEmbedding()
-
-        vectors = list(embedding_model.embed([doc[1] for doc in documents]))
-        data = [
-            {
-                "id": i,
-                "vector": vectors[i],
-                "text": documents[i][1],
-                "title": documents[i][0],
-            }
-            for i in range(len(vectors))
-        ]
+    # Embedding of batch N+1 overlaps with the insert of batch N
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    async def produce():
+        batches = _embed_cached(documents)
+        for start, batch_vectors in zip(
+            range(0, len(documents), PIPELINE_BATCH_SIZE), batches
+        ):
+            batch = documents[start : start + PIPELINE_BATCH_SIZE]
+            # Wait from a thread so cancelling this task never cancels the cached
+            # future, which later index calls still depend on
+            vectors = await asyncio.to_thread(batch_vectors.result)
+            await queue.put((start, batch, vectors))
+
+        await queue.put(None)
+
+    async def consume():
+        while (item := await queue.get()) is not None:
+            await asyncio.to_thread(insert, *item)
+
+    await asyncio.gather(produce(), consume())
+
+
+def _index_milvus(connection: MilvusClient, documents: list[tuple[str, str]]):
+    def insert(start: int, batch: list[tuple[str, str]], vectors: np.ndarray):
+        # MilvusClient.insert treats a dict as a single row, so columnar data is
+        # not an option here; float32 ndarray rows are packed by pymilvus as-is
         connection.insert(
             collection_name=milvus_settings.collection_name,
-            data=data,
-        )
-    elif isinstance(connection, Pinecone):
-        index = connection.Index(pinecone_settings.index_name)
-        index.upsert_records(
-            "namespace",
-            [
-                {"_id": str(ObjectId()), "title": doc[0], "text": doc[1]}
-                for doc in documents
+            data=[
+                {"id": start + i, "vector": vector, "text": text, "title": title}
+                for i, ((title, text), vector) in enumerate(zip(batch, vectors))
             ],
         )
-    elif isinstance(connection, MongoClient):
-        embedding_model = TextEmbedding()
-        embeddings = list(embedding_model.embed([doc[1] for doc in documents]))
-        collection = connection[mongo_settings.db_name][mongo_settings.collection_name]
+
+    asyncio.run(_index_pipeline(documents, insert))
+
+
+def _index_pinecone(connection: Pinecone, documents: list[tuple[str, str]]):
+    from bson import ObjectId
+
+    index = _get_pinecone_index()
+    index.upsert_records(
+        "namespace",
+        [
+            {"_id": str(ObjectId()), "title": doc[0], "text": doc[1]}
+            for doc in documents
+        ],
+    )
+
+
+def _index_mongo(connection: MongoClient, documents: list[tuple[str, str]]):
+    from bson.binary import Binary, BinaryVectorDtype
+
+    collection = connection[mongo_settings.db_name][mongo_settings.collection_name]
+
+    def insert(start: int, batch: list[tuple[str, str]], embeddings: np.ndarray):
         collection.insert_many(
             [
-                {"text": doc[1], "title": doc[0], "embedding": emb.tolist()}
-                for emb, doc in zip(embeddings, documents)
+                {
+                    "text": doc[1],
+                    "title": doc[0],
+                    "embedding": Binary.from_vector(emb, BinaryVectorDtype.FLOAT32),
+                }
+                for emb, doc in zip(embeddings, batch)
             ]
         )
-    elif isinstance(connection, QdrantClient):
-        connection.add(
-            collection_name=qdrant_settings.collection_name,
-            documents=[doc[1] for doc in documents],
-            metadata=[{"title": doc[0]} for doc in documents],
-            ids=[str(uuid.uuid4()) for _ in documents],
-        )
+
+    asyncio.run(_index_pipeline(documents, insert))
+
+
+def _index_qdrant(connection: QdrantClient, documents: list[tuple[str, str]]):
+    # Millisecond prefix keeps ids from separate uploads from overwriting each other
+    first_id = (time.time_ns() // 1_000_000) << 20
+    connection.add(
+        collection_name=qdrant_settings.collection_name,
+        documents=[doc[1] for doc in documents],
+        metadata=[{"title": doc[0]} for doc in documents],
+        ids=list(range(first_id, first_id + len(documents))),
+    )
+
+
+# Keyed by client class name so the SDKs don't have to be imported up front
+INDEXERS: dict[str, Callable[[Any, list[tuple[str, str]]], None]] = {
+    "MilvusClient": _index_milvus,
+    "Pinecone": _index_pinecone,
+    "MongoClient": _index_mongo,
+    "QdrantClient": _index_qdrant,
+}
+
+
+def index_documents(
+    connection: CONNECTION_TYPES,
+    documents: list[tuple[str, str]],
+):
+    INDEXERS[type(connection).__name__](connection, documents)
 
 
 # Searching
+def _search_milvus(
+    connection: MilvusClient,
+    query: str,
+    top_k: int,
+) -> list[tuple[str, str, float]]:
+    query_vector = _get_query_embedding(query)
+
+    res = connection.search(
+        collection_name=milvus_settings.collection_name,
+        data=[query_vector],
+        limit=top_k,
+        output_fields=["title", "text"],
+    )
+    return [
+        (hit["entity"]["title"], hit["entity"]["text"], hit["distance"])
+        for hits in res
+        for hit in hits
+    ]
+
+
+def _search_pinecone(
+    connection: Pinecone,
+    query: str,
+    top_k: int,
+) -> list[tuple[str, str, float]]:
+    index = _get_pinecone_index()
+    results = index.search(
+        namespace="namespace",
+        query={
+            "inputs": {
+                "text": query,
+            },
+            "top_k": top_k,
+        },  # type: ignore
+    )
+    return [
+        (hit["fields"]["title"], hit["fields"]["text"], hit["_score"])
+        for hit in results["result"]["hits"]
+    ]
+
+
+def _search_mongo(
+    connection: MongoClient,
+    query: str,
+    top_k: int,
+) -> list[tuple[str, str, float]]:
+    query_vector = _get_query_embedding(query)
+
+    pipeline = [
+        {
+            "$vectorSearch": {
+                "index": "default",
+                "path": "embedding",
+                "queryVector": query_vector.tolist(),
+                "numCandidates": 100,
+                "limit": top_k,
+            }
+        },
+        {
+            "$project": {
+                "title": 1,
+                "text": 1,
+                "score": {"$meta": "vectorSearchScore"},
+            }
+        },
+    ]
+    collection = connection[mongo_settings.db_name][mongo_settings.collection_name]
+    return [
+        (doc["title"], doc["text"], doc["score"])
+        for doc in collection.aggregate(pipeline)
+    ]
+
+
+def _search_qdrant(
+    connection: QdrantClient,
+    query: str,
+    top_k: int,
+) -> list[tuple[str, str, float]]:
+    res = connection.query(
+        collection_name=qdrant_settings.collection_name,
+        query_text=query,
+        limit=top_k,
+    )
+    return [(hit.metadata["title"], hit.document, hit.score) for hit in res]
+
+
+SEARCHERS: dict[str, Callable[[Any, str, int], list[tuple[str, str, float]]]] = {
+    "MilvusClient": _search_milvus,
+    "Pinecone": _search_pinecone,
+    "MongoClient": _search_mongo,
+    "QdrantClient": _search_qdrant,
+}
+
+
 def search_documents(
     connection: CONNECTION_TYPES,
     query: str,
     top_k: int = 3,
 ) -> list[tuple[str, str, float]]:
-    if isinstance(connection, MilvusClient):
-        embedding_model = TextEmbedding()
-        query_vectors = list(embedding_model.embed([query]))
+    return SEARCHERS[type(connection).__name__](connection, query, top_k)
 
-        res = connection.search(
-            collection_name=milvus_settings.collection_name,
-            data=query_vectors,
-            limit=top_k,
-            output_fields=["title", "text"],
-        )
-        return [
-            (hit["entity"]["title"], hit["entity"]["text"], hit["distance"])
-            for hits in res
-            for hit in hits
-        ]
-    elif isinstance(connection, Pinecone):
-        index = connection.Index(pinecone_settings.index_name)
-        results = index.search(
-            namespace="namespace",
-            query={
-                "inputs": {
-                    "text": query,
-                },
-                "top_k": top_k,
-            },  # type: ignore
-        )
-        return [
-            (hit["fields"]["title"], hit["fields"]["text"], hit["_score"])
-            for hit in results["result"]["hits"]
-        ]
-    elif isinstance(connection, MongoClient):
-        embedding_model = TextEmbedding()
-        query_vectors = list(embedding_model.embed([query]))
-
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": "default",
-                    "path": "embedding",
-                    "queryVector": query_vectors[0].tolist(),
-                    "numCandidates": 100,
-                    "limit": top_k,
-                }
-            },
-            {
-                "$project": {
-                    "title": 1,
-                    "text": 1,
-                    "score": {"$meta": "vectorSearchScore"},
-                }
-            },
-        ]
-        collection = connection[mongo_settings.db_name][mongo_settings.collection_name]
-        return [
-            (doc["title"], doc["text"], doc["score"])
-            for doc in collection.aggregate(pipeline)
-        ]
-    elif isinstance(connection, QdrantClient):
-        res = connection.query(
-            collection_name=qdrant_settings.collection_name,
-            query_text=query,
-            limit=top_k,
-        )
-        return [(hit.metadata["title"], hit.document, hit.score) for hit in res]
+
+# Read a text document out of the uploaded ZIP, skipping anything undecodable
+def _read_zip_entry(
+    zip_ref: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+) -> tuple[str, str] | None:
+    try:
+        return Path(info.filename).name, zip_ref.read(info).decode("utf-8")
+    except Exception:
+        return None
+
+
+def _is_document_entry(info: zipfile.ZipInfo) -> bool:
+    path = Path(info.filename)
+    return (
+        not info.is_dir()
+        and "." in path.name
+        and not path.name.startswith("._")
+        and "__MACOSX" not in path.parts
+    )
+
+
+# Drop documents whose text was already seen, keeping the first occurrence
+def _dedupe_documents(documents: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    seen: dict[bytes, tuple[str, str]] = {}
+    for doc in documents:
+        seen.setdefault(hashlib.blake2b(doc[1].encode(), digest_size=16).digest(), doc)
+
+    return list(seen.values())
 
 
 # Streamlit Interface
@@ -206,26 +441,23 @@ uploaded_file = st.file_uploader(
 if "docs" not in st.session_state:
     st.session_state.docs = []
 
-if uploaded_file:
-    with tempfile.TemporaryDirectory() as tmpdir:
-        zip_path = Path(tmpdir) / f"{secrets.token_urlsafe(16)}.zip"
-        with open(zip_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(tmpdir)
-            docs: list[tuple[str, str]] = []
-            for path in Path(tmpdir).glob("**/*.*"):
-                if path.is_dir():
-                    continue
-
-                try:
-                    with open(path) as doc_file:
-                        docs.append((path.name, doc_file.read()))
-                except Exception:
-                    pass
-            st.session_state.docs = docs
+# Streamlit reruns the script on every interaction, only parse each upload once
+if uploaded_file and st.session_state.get("uploaded_file_id") != uploaded_file.file_id:
+    with zipfile.ZipFile(io.BytesIO(uploaded_file.getbuffer())) as zip_ref:
+        # zlib releases the GIL, so entries inflate in parallel
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            entries = executor.map(
+                lambda info: _read_zip_entry(zip_ref, info),
+                [info for info in zip_ref.infolist() if _is_document_entry(info)],
+            )
+            docs: list[tuple[str, str]] = [doc for doc in entries if doc is not None]
+        docs = _dedupe_documents(
+            [(name, text[:MAX_DOCUMENT_CHARS]) for name, text in docs]
+        )
+        st.session_state.docs = docs
+        st.session_state.uploaded_file_id = uploaded_file.file_id
 
+if uploaded_file:
     st.success(f"Uploaded {len(st.session_state.docs)} documents.")
 
 # Database selection - moved below upload
@@ -235,6 +467,10 @@ db_choice: DATABASE_NAMES = st.selectbox(
 
 connection = get_connection(db_choice)
 
+# Start embedding before "Index" is clicked, Pinecone and QDrant embed server-side
+if st.session_state.docs and db_choice in ("Milvus", "MongoDB"):
+    _embed_cached(st.session_state.docs)
+
 # Indexing button
 if st.session_state.docs:
     if st.button("Index Documents"):
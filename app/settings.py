@@ -1,4 +1,4 @@
-from functools import lru_cache
+from functools import cached_property, lru_cache
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,7 +14,6 @@ class QDrantConfig(BaseSettings):
     )
 
     @staticmethod
-    @lru_cache()
     def get_settings() -> "QDrantConfig":
         return QDrantConfig()  # type: ignore
 
@@ -30,7 +29,6 @@ class MilvusConfig(BaseSettings):
     )
 
     @staticmethod
-    @lru_cache()
     def get_settings() -> "MilvusConfig":
         return MilvusConfig()  # type: ignore
 
@@ -48,7 +46,6 @@ class MongoDBConfig(BaseSettings):
     )
 
     @staticmethod
-    @lru_cache()
     def get_settings() -> "MongoDBConfig":
         return MongoDBConfig()  # type: ignore
 
@@ -65,7 +62,6 @@ class PineconeConfig(BaseSettings):
     )
 
     @staticmethod
-    @lru_cache()
     def get_settings() -> "PineconeConfig":
         return PineconeConfig()  # type: ignore
 
@@ -75,6 +71,9 @@ class Settings(BaseSettings):
     streamlit_server_port: int
     streamlit_server_address: str
 
+    # Embedding config (fastembed serves this model as an int8 quantized ONNX)
+    embedding_model: str = "BAAI/bge-small-en-v1.5"
+
     model_config = SettingsConfigDict(
         extra="allow",
         env_file=".env",
@@ -82,37 +81,21 @@ class Settings(BaseSettings):
         env_prefix="VECTOR_SEARCH_APP_",
     )
 
-    @property
+    @cached_property
     def qdrant_database_config(self) -> QDrantConfig:
-        if hasattr(self, "_qdrant_database_config"):
-            return getattr(self, "_qdrant_database_config")
+        return QDrantConfig.get_settings()
 
-        setattr(self, "_qdrant_database_config", QDrantConfig.get_settings())
-        return getattr(self, "_qdrant_database_config")
-
-    @property
+    @cached_property
     def milvus_database_config(self) -> MilvusConfig:
-        if hasattr(self, "_milvus_database_config"):
-            return getattr(self, "_milvus_database_config")
-
-        setattr(self, "_milvus_database_config", MilvusConfig.get_settings())
-        return getattr(self, "_milvus_database_config")
+        return MilvusConfig.get_settings()
 
-    @property
+    @cached_property
     def mongodb_database_config(self) -> MongoDBConfig:
-        if hasattr(self, "_mongodb_database_config"):
-            return getattr(self, "_mongodb_database_config")
+        return MongoDBConfig.get_settings()
 
-        setattr(self, "_mongodb_database_config", MongoDBConfig.get_settings())
-        return getattr(self, "_mongodb_database_config")
-
-    @property
+    @cached_property
     def pinecone_database_config(self) -> PineconeConfig:
-        if hasattr(self, "_pinecone_database_config"):
-            return getattr(self, "_pinecone_database_config")
-
-        setattr(self, "_pinecone_database_config", PineconeConfig.get_settings())
-        return getattr(self, "_pinecone_database_config")
+        return PineconeConfig.get_settings()
 
     @staticmethod
     @lru_cache()